@@ -77,7 +77,14 @@ class WebSocketService extends EventEmitter {
       this.ws.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data) as WebSocketMessage;
-          this.emit('message', message);
+          if (message.type === 'batch' && Array.isArray(message.messages)) {
+            // Queued messages are delivered in one frame on reconnect
+            for (const queued of message.messages as WebSocketMessage[]) {
+              this.emit('message', queued);
+            }
+          } else {
+            this.emit('message', message);
+          }
         } catch (error) {
           console.error('Failed to parse WebSocket message:', error);
         }
@@ -1,23 +1,41 @@
+import time
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
+from sqlalchemy import engine_from_config, text
 
 from alembic import context
 
 from app.config import settings
 
-this = context.meta
 config = context.config
 
-fileConfig(config.config_file_name)
+# Skipped when migrations run inside the app so its log handlers are kept
+if config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
 
 target_metadata = None
 
+# Key of the session-level advisory lock held while migrating online
+MIGRATION_LOCK_ID = 7_246_871_313
+
+
+def acquire_migration_lock(connection):
+    """Wait for the migration lock without holding a transaction open
+
+    A session blocked in pg_advisory_lock() sits in a transaction that
+    CREATE INDEX CONCURRENTLY in the running migration would wait for, so
+    poll with pg_try_advisory_lock() instead.
+    """
+    lock = text("SELECT pg_try_advisory_lock(:id)")
+    while not connection.execute(lock, {"id": MIGRATION_LOCK_ID}).scalar():
+        connection.commit()
+        time.sleep(0.5)
+    connection.commit()
+
 
 def get_database_url():
     """Get database URL from settings"""
-    return f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+    return f"postgresql+psycopg2://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
 
 def run_migrations_offline():
@@ -27,6 +45,7 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -36,18 +55,36 @@ def run_migrations_offline():
 def run_migrations_online():
     configuration = config.get_section(config.config_ini_section)
     configuration["sqlalchemy.url"] = get_database_url()
+    configuration["sqlalchemy.pool_size"] = "2"
+    configuration["sqlalchemy.max_overflow"] = "0"
+    configuration["sqlalchemy.pool_pre_ping"] = "true"
 
-    connectable = engine_from_config(
-        configuration,
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    connectable = engine_from_config(configuration, prefix="sqlalchemy.")
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
-
-        with context.begin_transaction():
-            context.run_migrations()
+        # Every worker or replica that starts up runs the upgrade; the lock
+        # makes them take turns, and later ones find the schema at head
+        acquire_migration_lock(connection)
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                transaction_per_migration=True,
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            # A failed migration leaves its transaction aborted
+            connection.rollback()
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            connection.commit()
+
+    # Migrations may run inside the app process; don't leave pooled
+    # connections open once they are done
+    connectable.dispose()
 
 
 if context.is_offline_mode():
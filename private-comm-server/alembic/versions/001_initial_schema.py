@@ -51,25 +51,28 @@ def upgrade():
         );
     """)
 
-    op.execute("""
-        CREATE INDEX IF NOT EXISTS idx_pending_messages_recipient
-        ON pending_messages(recipient_id);
-    """)
+    # CONCURRENTLY cannot run inside a transaction block, and avoids holding
+    # a write lock on the tables while the indexes are built.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_messages_recipient
+            ON pending_messages(recipient_id);
+        """)
 
-    op.execute("""
-        CREATE INDEX IF NOT EXISTS idx_pending_messages_delivery
-        ON pending_messages(recipient_id, timestamp DESC);
-    """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_messages_delivery
+            ON pending_messages(recipient_id, timestamp DESC);
+        """)
 
-    op.execute("""
-        CREATE INDEX IF NOT EXISTS idx_one_time_prekeys_available
-        ON one_time_prekeys(user_id, used) WHERE NOT used;
-    """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_one_time_prekeys_available
+            ON one_time_prekeys(user_id, used) WHERE NOT used;
+        """)
 
-    op.execute("""
-        CREATE INDEX IF NOT EXISTS idx_one_time_prekeys_fresh
-        ON one_time_prekeys(user_id, created_at) WHERE NOT used;
-    """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_one_time_prekeys_fresh
+            ON one_time_prekeys(user_id, created_at) WHERE NOT used;
+        """)
 
 
 def downgrade():
@@ -0,0 +1,50 @@
+from alembic import op
+
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # phone_hash holds the raw 32-byte SHA-256 digest; the API still takes
+    # and returns it hex-encoded and converts at the query boundary.
+    # The type change rebuilds users_phone_hash_key, so uniqueness holds
+    # throughout. Databases created from schema.sql already have the BYTEA
+    # column and its CHECK, so the conversion is skipped there.
+    op.execute("""
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'users' AND column_name = 'phone_hash') <> 'bytea'
+            THEN
+                ALTER TABLE users
+                    ALTER COLUMN phone_hash TYPE BYTEA USING decode(phone_hash, 'hex'),
+                    ADD CONSTRAINT users_phone_hash_check CHECK (length(phone_hash) = 32);
+            END IF;
+        END
+        $$;
+    """)
+
+    # CONCURRENTLY cannot run inside a transaction block, and avoids holding
+    # a write lock on the table while the index is built.
+    with op.get_context().autocommit_block():
+        # Covers the key bundle lookup so it can be served by an index-only scan
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_phone_hash_idx
+            ON users(phone_hash) INCLUDE (id, identity_key, signed_prekey, prekey_signature);
+        """)
+
+    # The covering index now enforces uniqueness on its own
+    op.execute("ALTER TABLE users DROP CONSTRAINT IF EXISTS users_phone_hash_key;")
+
+
+def downgrade():
+    op.execute("""
+        ALTER TABLE users
+            DROP CONSTRAINT IF EXISTS users_phone_hash_check,
+            ALTER COLUMN phone_hash TYPE VARCHAR(64) USING encode(phone_hash, 'hex'),
+            ADD CONSTRAINT users_phone_hash_key UNIQUE (phone_hash);
+    """)
+    op.execute("DROP INDEX IF EXISTS users_phone_hash_idx;")
@@ -0,0 +1,35 @@
+from alembic import op
+
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Payloads are kept as the Base64 text clients send. encode() wraps its
+    # output every 76 characters, so strip the line breaks. Databases created
+    # from schema.sql already have the TEXT column and are left alone.
+    op.execute("""
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'pending_messages'
+                  AND column_name = 'encrypted_payload') = 'bytea'
+            THEN
+                ALTER TABLE pending_messages
+                    ALTER COLUMN encrypted_payload TYPE TEXT
+                    USING translate(encode(encrypted_payload, 'base64'), E'\\n', '');
+            END IF;
+        END
+        $$;
+    """)
+
+
+def downgrade():
+    op.execute("""
+        ALTER TABLE pending_messages
+            ALTER COLUMN encrypted_payload TYPE BYTEA
+            USING decode(encrypted_payload, 'base64');
+    """)
@@ -0,0 +1,31 @@
+from alembic import op
+
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction block, and avoids holding
+    # a write lock on pending_messages while the indexes change.
+    with op.get_context().autocommit_block():
+        # Rows arrive in roughly timestamp order, so a BRIN index stays small
+        # and serves the 30-day range delete in maintenance
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_messages_ts_brin
+            ON pending_messages USING BRIN (timestamp);
+        """)
+
+        # Same leading column as idx_pending_messages_delivery; only adds
+        # write cost
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_pending_messages_recipient;")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_messages_recipient
+            ON pending_messages(recipient_id);
+        """)
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_pending_messages_ts_brin;")
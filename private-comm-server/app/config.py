@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 
 class Settings:
@@ -32,9 +32,30 @@ class Settings:
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
 
     DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
-    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+    # Sized for database concurrency, independent of the WebSocket count:
+    # sockets only borrow a connection to drain or store pending messages
+    DB_POOL_MAX_SIZE: int = int(
+        os.getenv(
+            "DB_POOL_MAX_SIZE",
+            str(max(DB_POOL_MIN_SIZE, min(4 * (os.cpu_count() or 4), 50))),
+        )
+    )
+    # Set to 0 when running behind pgbouncer in transaction pooling mode
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1024"))
+
+    # sync: migrate before serving, async: migrate in the background while
+    # /health reports degraded, skip: migrations are run out of band
+    MIGRATION_MODE: str = os.getenv("MIGRATION_MODE", "sync")
+
+    WS_OUTBOUND_BUFFER: int = int(os.getenv("WS_OUTBOUND_BUFFER", "64"))
+    WS_REGISTRY_SHARDS: int = int(
+        os.getenv("WS_REGISTRY_SHARDS", str(4 * (os.cpu_count() or 4)))
+    )
 
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:19006")
+    CORS_ORIGINS_LIST: Tuple[str, ...] = tuple(
+        origin.strip() for origin in CORS_ORIGINS.split(",") if origin.strip()
+    )
 
     def validate_production_settings(self) -> None:
         """Validate that required settings are set in production"""
@@ -0,0 +1,24 @@
+import asyncpg
+import pybase64
+
+
+def _encode_bytea(value) -> bytes:
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        raise TypeError(f"BYTEA parameters must be bytes, not {type(value).__name__}")
+    return bytes(value)
+
+
+def _decode_bytea(data: bytes) -> str:
+    return pybase64.b64encode(data).decode()
+
+
+async def register_bytea_codec(conn: asyncpg.Connection):
+    """Read BYTEA columns as Base64 text; parameters are still bound as raw bytes"""
+    await conn.set_type_codec(
+        "bytea",
+        schema="pg_catalog",
+        encoder=_encode_bytea,
+        decoder=_decode_bytea,
+        format="binary",
+    )
+
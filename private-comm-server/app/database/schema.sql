@@ -1,7 +1,7 @@
 -- User registration and key storage
 CREATE TABLE users (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    phone_hash VARCHAR(64) UNIQUE NOT NULL,  -- SHA-256 of phone number
+    phone_hash BYTEA NOT NULL CHECK (length(phone_hash) = 32),  -- raw SHA-256 of phone number
     identity_key BYTEA NOT NULL,              -- Ed25519 public key
     signed_prekey BYTEA NOT NULL,             -- Signed pre-key bundle
     prekey_signature BYTEA NOT NULL,          -- Signature of signed_prekey
@@ -25,7 +25,7 @@ CREATE TABLE pending_messages (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     recipient_id UUID REFERENCES users(id) ON DELETE CASCADE,
     sender_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    encrypted_payload BYTEA NOT NULL,  -- Server CANNOT decrypt this
+    encrypted_payload TEXT NOT NULL,   -- Base64 ciphertext as sent; server CANNOT decrypt this
     timestamp TIMESTAMP DEFAULT NOW()
 );
 
@@ -37,7 +37,8 @@ CREATE TABLE push_tokens (
     PRIMARY KEY (user_id, token)
 );
 
-CREATE INDEX idx_pending_messages_recipient ON pending_messages(recipient_id);
+CREATE UNIQUE INDEX users_phone_hash_idx ON users(phone_hash) INCLUDE (id, identity_key, signed_prekey, prekey_signature);
+CREATE INDEX idx_pending_messages_ts_brin ON pending_messages USING BRIN (timestamp);
 CREATE INDEX idx_pending_messages_delivery ON pending_messages(recipient_id, timestamp DESC);
 CREATE INDEX idx_one_time_prekeys_available ON one_time_prekeys(user_id, used) WHERE NOT used;
 CREATE INDEX idx_one_time_prekeys_fresh ON one_time_prekeys(user_id, created_at) WHERE NOT used;
@@ -0,0 +1,197 @@
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+
+import asyncpg
+import orjson
+from fastapi import WebSocket
+
+from app.config import settings
+from app.utils import logging as app_logging
+
+logger = app_logging.CorrelationLogger(__name__)
+
+db_pool: Optional[asyncpg.Pool] = None
+migration_done = asyncio.Event()
+
+
+def set_db_pool(pool: asyncpg.Pool):
+    global db_pool
+    db_pool = pool
+
+
+# (sender_id, payload) of a relayed encrypted message
+PendingMessage = Tuple[str, str]
+# Queued text frame, with the message to store if it is never sent
+Outbound = Tuple[str, Optional[PendingMessage]]
+UndeliveredHandler = Callable[[str, List[PendingMessage]], Awaitable[None]]
+
+
+class WsClient:
+    """A connected socket with a bounded outbound queue drained by its own task"""
+
+    def __init__(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        buffer_size: int,
+        on_undelivered: Optional[UndeliveredHandler] = None,
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue[Outbound] = asyncio.Queue(maxsize=buffer_size)
+        self.writer_task: Optional[asyncio.Task] = None
+        # Set once the client stops accepting frames
+        self.closed = False
+        self._in_flight: Optional[Outbound] = None
+        self._on_undelivered = on_undelivered
+
+    def start(self) -> asyncio.Task:
+        self.writer_task = asyncio.create_task(self._drain())
+        return self.writer_task
+
+    async def _drain(self):
+        try:
+            while True:
+                self._in_flight = await self.queue.get()
+                await self.websocket.send_text(self._in_flight[0])
+                self._in_flight = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"WebSocket writer stopped: {e}")
+        await self._release()
+
+    async def _release(self):
+        """Stop accepting frames and hand back the messages that were not sent"""
+        if self.closed:
+            return
+        self.closed = True
+        # A frame cancelled or failed mid-send may not have arrived, so it is
+        # handed back too: delivery is at least once
+        unsent = [] if self._in_flight is None else [self._in_flight]
+        self._in_flight = None
+        while not self.queue.empty():
+            unsent.append(self.queue.get_nowait())
+        undelivered = [message for _, message in unsent if message is not None]
+        if not undelivered or self._on_undelivered is None:
+            return
+        try:
+            await self._on_undelivered(self.user_id, undelivered)
+        except Exception:
+            logger.error(
+                f"User {self.user_id[:8]}... lost {len(undelivered)} undelivered messages",
+                exc_info=True,
+            )
+
+    async def close(self):
+        if self.writer_task is not None:
+            # A writer that already failed is releasing its own queue
+            if not self.closed:
+                self.writer_task.cancel()
+            await asyncio.wait([self.writer_task])
+        await self._release()
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+Registry = weakref.WeakValueDictionary[str, WsClient]
+
+
+class ConnectionManager:
+    """Connected users, sharded by user id so calls only contend on one shard's lock"""
+
+    def __init__(self, shards: int = settings.WS_REGISTRY_SHARDS):
+        # Shards only hold weak references; each WsClient is kept alive by
+        # connect() until its writer starts and by that task afterwards, so a
+        # connection whose writer has stopped drops out of the registry even
+        # if disconnect() was never reached.
+        self._shards: List[Tuple[Registry, asyncio.Lock]] = [
+            (weakref.WeakValueDictionary(), asyncio.Lock()) for _ in range(shards)
+        ]
+        self._writers: Set[asyncio.Task] = set()
+        self._on_undelivered: Optional[UndeliveredHandler] = None
+
+    def set_undelivered_handler(self, handler: UndeliveredHandler):
+        """Called with relayed messages a dropped connection never sent"""
+        self._on_undelivered = handler
+
+    def _shard(self, user_id: str) -> Tuple[Registry, asyncio.Lock]:
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    async def connect(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        backlog: Optional[Callable[[WebSocket], Awaitable[None]]] = None,
+    ):
+        """Register the socket and start its writer
+
+        `backlog` runs once the user is registered but before the writer
+        starts, so it may write to the socket directly; frames relayed in the
+        meantime are queued and delivered after it.
+        """
+        await websocket.accept()
+        client = WsClient(
+            user_id, websocket, settings.WS_OUTBOUND_BUFFER, self._on_undelivered
+        )
+        connections, lock = self._shard(user_id)
+        async with lock:
+            previous = connections.get(user_id)
+            connections[user_id] = client
+        if previous is not None:
+            await previous.close()
+        logger.info(f"User {user_id[:8]}... connected")
+        if backlog is not None:
+            await backlog(websocket)
+        writer = client.start()
+        self._writers.add(writer)
+        writer.add_done_callback(self._writers.discard)
+
+    async def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        """Drop the user's connection, or only `websocket` if it is still the current one"""
+        connections, lock = self._shard(user_id)
+        async with lock:
+            client = connections.get(user_id)
+            if client is None or (
+                websocket is not None and client.websocket is not websocket
+            ):
+                return
+            del connections[user_id]
+        await client.close()
+        logger.info(f"User {user_id[:8]}... disconnected")
+
+    async def send_frame(
+        self, user_id: str, frame: str, message: Optional[PendingMessage] = None
+    ) -> bool:
+        """Queue an already-serialized JSON text frame for the user
+
+        `message` is handed to the undelivered handler if the connection
+        drops before the frame is sent.
+        """
+        connections, lock = self._shard(user_id)
+        async with lock:
+            client = connections.get(user_id)
+        if client is None or client.closed:
+            return False
+        try:
+            client.queue.put_nowait((frame, message))
+        except asyncio.QueueFull:
+            logger.warning(f"User {user_id[:8]}... outbound queue full, evicting")
+            await self.disconnect(user_id, client.websocket)
+            return False
+        return True
+
+    async def send_to_user(self, user_id: str, message: dict) -> bool:
+        """Queue a message for the user; slow consumers whose queue is full are evicted"""
+        return await self.send_frame(user_id, orjson.dumps(message).decode())
+
+    async def broadcast(self, user_ids: Iterable[str], message: dict) -> List[str]:
+        """Serialize once and queue for every user; returns the ids it was queued for"""
+        frame = orjson.dumps(message).decode()
+        return [uid for uid in user_ids if await self.send_frame(uid, frame)]
+
+
+manager = ConnectionManager()
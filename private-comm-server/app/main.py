@@ -1,7 +1,5 @@
 from fastapi import (
     FastAPI,
-    WebSocket,
-    WebSocketDisconnect,
     HTTPException,
     Depends,
     Request,
@@ -12,14 +10,18 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
+from alembic import command
+from alembic.config import Config
+import asyncio
 import asyncpg
 import json
 import os
-from typing import Dict, Optional
 from datetime import datetime
 import logging
 from app.config import settings
 from app.utils import logging as app_logging
+from app.internal import state
+from app.database.connection import register_bytea_codec
 from app.routes import registration, websocket, auth, health
 from app import maintenance
 
@@ -30,12 +32,29 @@ auth.set_secret_key(settings.SECRET_KEY)
 
 limiter = Limiter(key_func=get_remote_address)
 
-db_pool: Optional[asyncpg.Pool] = None
+SERVER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _upgrade_schema():
+    config = Config(os.path.join(SERVER_ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(SERVER_ROOT, "alembic"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+
+async def _run_migrations(done: asyncio.Event):
+    """Apply Alembic migrations off the event loop and signal completion"""
+    try:
+        await asyncio.to_thread(_upgrade_schema)
+    except Exception:
+        logger.error("Database migration failed", exc_info=True)
+        raise
+    done.set()
+    logger.info("Database migrations complete")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global db_pool
     db_pool = await asyncpg.create_pool(
         host=settings.DB_HOST,
         port=settings.DB_PORT,
@@ -44,26 +63,58 @@ async def lifespan(app: FastAPI):
         database=settings.DB_NAME,
         min_size=settings.DB_POOL_MIN_SIZE,
         max_size=settings.DB_POOL_MAX_SIZE,
+        # The query set is small and fixed, so keep every prepared statement
+        # for the life of the connection instead of re-parsing after the
+        # default 300s lifetime or LRU eviction.
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        max_cached_statement_lifetime=0,
+        max_cacheable_statement_size=15 * 1024,
+        # Every query is a short point lookup or small write; JIT compilation
+        # would cost more than it saves. TIMESTAMP columns are stored as UTC.
+        server_settings={
+            "jit": "off",
+            "application_name": "privcomm",
+            "timezone": "UTC",
+        },
+        init=register_bytea_codec,
     )
 
+    state.set_db_pool(db_pool)
+
+    migration_task = None
+    if settings.MIGRATION_MODE == "sync":
+        try:
+            await _run_migrations(state.migration_done)
+        except Exception as e:
+            await db_pool.close()
+            raise RuntimeError("Database migrations failed") from e
+    elif settings.MIGRATION_MODE == "async":
+        migration_task = asyncio.create_task(_run_migrations(state.migration_done))
+    elif settings.MIGRATION_MODE == "skip":
+        state.migration_done.set()
+    else:
+        raise ValueError(f"Unknown MIGRATION_MODE: {settings.MIGRATION_MODE}")
+
     maintenance.set_db_pool(db_pool)
     maintenance.start_scheduler()
 
     yield
 
+    if migration_task is not None:
+        # The migration thread cannot be interrupted; let it finish cleanly.
+        # A failure has already been logged and reported by /health.
+        await asyncio.gather(migration_task, return_exceptions=True)
     await db_pool.close()
     maintenance.stop_scheduler()
 
 
 app = FastAPI(title="Private Communication Server", lifespan=lifespan)
 
-cors_origins = settings.CORS_ORIGINS.split(",")
-
 app.state.limiter = limiter
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[origin.strip() for origin in cors_origins],
+    allow_origins=list(settings.CORS_ORIGINS_LIST),
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS", "PUT", "DELETE"],
     allow_headers=["Authorization", "Content-Type", "X-Requested-With"],
@@ -78,43 +129,9 @@ async def rate_limit_exception_handler(request, exc):
     )
 
 
-active_connections: Dict[str, WebSocket] = {}
-
-
-class ConnectionManager:
-    def __init__(self):
-        self._lock = None
-
-    async def _get_lock(self):
-        if self._lock is None:
-            import asyncio
-
-            self._lock = asyncio.Lock()
-        return self._lock
-
-    async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        async with await self._get_lock():
-            if user_id in active_connections:
-                try:
-                    await active_connections[user_id].close()
-                except:
-                    pass
-            active_connections[user_id] = websocket
-        logger.info(f"User {user_id[:8]}... connected")
-
-    async def disconnect(self, user_id: str):
-        async with await self._get_lock():
-            if user_id in active_connections:
-                del active_connections[user_id]
-        logger.info(f"User {user_id[:8]}... disconnected")
-
-    async def send_to_user(self, user_id: str, message: dict) -> bool:
-        async with await self._get_lock():
-            if user_id in active_connections:
-                await active_connections[user_id].send_json(message)
-                return True
-        return False
-
-
-manager = ConnectionManager()
+app.include_router(health.router)
+if settings.ENVIRONMENT != "production":
+    app.include_router(health.debug_router)
+app.include_router(auth.router)
+app.include_router(registration.router)
+app.include_router(websocket.router)
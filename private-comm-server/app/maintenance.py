@@ -1,3 +1,4 @@
+import asyncio
 import asyncpg
 import logging
 from datetime import datetime
@@ -15,6 +16,32 @@ def set_db_pool(pool):
     db_pool = pool
 
 
+CLEANUP_BATCH_SIZE = 1000
+CLEANUP_BATCH_PAUSE = 0.05
+
+
+async def _delete_in_batches(table: str, condition: str) -> int:
+    """Delete matching rows in short batches so each statement holds locks briefly"""
+    query = f"""
+        WITH deleted AS (
+            DELETE FROM {table}
+            WHERE ctid IN (
+                SELECT ctid FROM {table} WHERE {condition} LIMIT {CLEANUP_BATCH_SIZE}
+            )
+            RETURNING 1
+        )
+        SELECT count(*) FROM deleted
+    """
+    total = 0
+    while True:
+        async with db_pool.acquire() as conn:
+            deleted = await conn.fetchval(query)
+        if not deleted:
+            return total
+        total += deleted
+        await asyncio.sleep(CLEANUP_BATCH_PAUSE)
+
+
 async def cleanup_old_messages():
     """Delete pending messages older than 30 days"""
     if not db_pool:
@@ -22,13 +49,11 @@ async def cleanup_old_messages():
         return
 
     try:
-        async with db_pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM pending_messages WHERE timestamp < NOW() - INTERVAL '30 days'"
-            )
-            deleted_count = result.split()[-1]
-            if deleted_count != "0":
-                logger.info(f"Cleaned up {deleted_count} old pending messages")
+        deleted_count = await _delete_in_batches(
+            "pending_messages", "timestamp < NOW() - INTERVAL '30 days'"
+        )
+        if deleted_count:
+            logger.info(f"Cleaned up {deleted_count} old pending messages")
     except Exception as e:
         logger.error(f"Error during message cleanup: {e}")
 
@@ -40,16 +65,11 @@ async def cleanup_unused_prekeys():
         return
 
     try:
-        async with db_pool.acquire() as conn:
-            result = await conn.execute(
-                """
-                DELETE FROM one_time_prekeys
-                WHERE used = TRUE AND created_at < NOW() - INTERVAL '7 days'
-                """
-            )
-            deleted_count = result.split()[-1]
-            if deleted_count != "0":
-                logger.info(f"Cleaned up {deleted_count} used prekeys")
+        deleted_count = await _delete_in_batches(
+            "one_time_prekeys", "used = TRUE AND created_at < NOW() - INTERVAL '7 days'"
+        )
+        if deleted_count:
+            logger.info(f"Cleaned up {deleted_count} used prekeys")
     except Exception as e:
         logger.error(f"Error during prekey cleanup: {e}")
 
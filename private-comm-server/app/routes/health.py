@@ -1,24 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime
+from fastapi.responses import JSONResponse
+from datetime import datetime, timezone
 import logging
+from app.internal import state
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/health", tags=["health"])
+debug_router = APIRouter(prefix="/debug", tags=["debug"])
 
 
 @router.get("/")
 async def health_check():
     """Health check for monitoring and load balancers"""
-    from app.main import db_pool
+    db_pool = state.db_pool
 
     health = {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "services": {
             "database": "unknown",
+            "migrations": "complete",
         },
     }
 
+    if not state.migration_done.is_set():
+        health["status"] = "degraded"
+        health["services"]["migrations"] = "pending"
+
     if db_pool:
         try:
             async with db_pool.acquire() as conn:
@@ -34,4 +42,19 @@ async def health_check():
 
     status_code = 200 if health["status"] == "healthy" else 503
 
-    return health
+    return JSONResponse(status_code=status_code, content=health)
+
+
+@debug_router.get("/pool")
+async def pool_stats():
+    """Database pool occupancy, for spotting pool exhaustion"""
+    db_pool = state.db_pool
+    if not db_pool:
+        return JSONResponse(status_code=503, content={"detail": "not initialized"})
+
+    return {
+        "size": db_pool.get_size(),
+        "idle": db_pool.get_idle_size(),
+        "min_size": db_pool.get_min_size(),
+        "max_size": db_pool.get_max_size(),
+    }
@@ -1,39 +1,118 @@
 from fastapi import APIRouter, HTTPException, Request, Depends
-from pydantic import BaseModel, validator, Field
+from pydantic import BaseModel, ConfigDict, Field, WithJsonSchema, field_validator
 import asyncpg
-from typing import List
-import base64
-import re
+from typing import Annotated, List
+import pybase64
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from app.internal import state
 
 limiter = Limiter(key_func=get_remote_address)
 router = APIRouter(prefix="/api/v1", tags=["registration"])
 
-router = APIRouter(prefix="/api/v1", tags=["registration"])
+# Upper bounds on the Base64 length of each key, checked before decoding;
+# Curve25519 keys encode to 44 chars and Ed25519 signatures to 88
+MAX_IDKEY_B64 = 128
+MAX_SPK_B64 = 128
+MAX_SIG_B64 = 128
+MAX_OTPK_B64 = 128
+MAX_ONE_TIME_PREKEYS = 200
+
+SQL_UPSERT_USER = """
+    INSERT INTO users (phone_hash, identity_key, signed_prekey, prekey_signature)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (phone_hash) DO UPDATE SET
+        identity_key = EXCLUDED.identity_key,
+        signed_prekey = EXCLUDED.signed_prekey,
+        prekey_signature = EXCLUDED.prekey_signature,
+        last_seen = NOW()
+    RETURNING id
+"""
+
+SQL_UPSERT_ONE_TIME_PREKEY = """
+    INSERT INTO one_time_prekeys (user_id, key_id, public_key)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (user_id, key_id)
+    DO UPDATE SET public_key = EXCLUDED.public_key, used = FALSE
+"""
+
+SQL_GET_KEY_BUNDLE_USER = """
+    SELECT id, identity_key, signed_prekey, prekey_signature
+    FROM users WHERE phone_hash = $1
+"""
+
+SQL_CLAIM_ONE_TIME_PREKEY = """
+    UPDATE one_time_prekeys
+    SET used = TRUE
+    WHERE id = (
+        SELECT id FROM one_time_prekeys
+        WHERE user_id = $1 AND NOT used
+        ORDER BY created_at
+        LIMIT 1
+    )
+    RETURNING key_id, public_key
+"""
+
+
+def _parse_phone_hash(value) -> bytes:
+    """Raw 32-byte SHA-256 digest from its 64-char hex wire form"""
+    digest = b""
+    if isinstance(value, str) and len(value) == 64:
+        try:
+            digest = bytes.fromhex(value)
+        except ValueError:
+            pass
+    if len(digest) != 32:
+        raise ValueError("phone_hash must be 64-char hex string")
+    return digest
 
 
-class RegisterRequest(BaseModel):
-    phone_hash: str = Field(..., min_length=64, max_length=64)
-    identity_key: str
-    signed_prekey: str
-    prekey_signature: str
-    one_time_prekeys: List[dict]
+def _decode_base64(v: bytes) -> bytes:
+    if len(v) % 4:
+        raise ValueError("Must be valid Base64 string")
+    try:
+        return pybase64.b64decode(v, validate=True)
+    except Exception:
+        raise ValueError("Must be valid Base64 string")
+
+
+class OneTimePrekey(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Stored in an INTEGER column
+    key_id: int = Field(..., ge=0, le=2**31 - 1)
+    # Base64 on the wire, decoded to raw bytes during validation
+    public_key: bytes = Field(..., max_length=MAX_OTPK_B64)
 
-    @validator("phone_hash")
+    @field_validator("public_key")
+    @classmethod
+    def validate_base64(cls, v):
+        return _decode_base64(v)
+
+
+class RegisterRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Hex-encoded SHA-256 on the wire, validated into the raw 32-byte digest
+    phone_hash: Annotated[
+        bytes, WithJsonSchema({"type": "string", "pattern": "^[0-9a-fA-F]{64}$"})
+    ]
+    # Key fields arrive as Base64 and are decoded to raw bytes during validation
+    identity_key: bytes = Field(..., max_length=MAX_IDKEY_B64)
+    signed_prekey: bytes = Field(..., max_length=MAX_SPK_B64)
+    prekey_signature: bytes = Field(..., max_length=MAX_SIG_B64)
+    one_time_prekeys: List[OneTimePrekey] = Field(..., max_length=MAX_ONE_TIME_PREKEYS)
+
+    @field_validator("phone_hash", mode="before")
+    @classmethod
     def validate_phone_hash(cls, v):
-        if not re.match(r"^[0-9a-f]{64}$", v):
-            raise ValueError("phone_hash must be 64-char hex string")
-        return v
+        return _parse_phone_hash(v)
 
-    @validator("identity_key", "signed_prekey", "prekey_signature")
+    @field_validator("identity_key", "signed_prekey", "prekey_signature")
+    @classmethod
     def validate_base64(cls, v):
-        try:
-            base64.b64decode(v, validate=True)
-        except Exception:
-            raise ValueError("Must be valid Base64 string")
-        return v
+        return _decode_base64(v)
 
 
 class KeyBundleResponse(BaseModel):
@@ -46,52 +125,21 @@ class KeyBundleResponse(BaseModel):
 @router.post("/register")
 @limiter.limit("10/hour")
 async def register_user(request: Request, req: RegisterRequest):
-    from app.main import db_pool
-
-    async with db_pool.acquire() as conn:
-        existing = await conn.fetchrow(
-            "SELECT id FROM users WHERE phone_hash = $1", req.phone_hash
-        )
-
-        if existing:
-            await conn.execute(
-                """
-                UPDATE users SET
-                    identity_key = $1,
-                    signed_prekey = $2,
-                    prekey_signature = $3,
-                    last_seen = NOW()
-                WHERE phone_hash = $4
-            """,
-                base64.b64decode(req.identity_key),
-                base64.b64decode(req.signed_prekey),
-                base64.b64decode(req.prekey_signature),
-                req.phone_hash,
-            )
-            user_id = existing["id"]
-        else:
+    async with state.db_pool.acquire() as conn:
+        async with conn.transaction():
             user_id = await conn.fetchval(
-                """
-                INSERT INTO users (phone_hash, identity_key, signed_prekey, prekey_signature)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
-            """,
+                SQL_UPSERT_USER,
                 req.phone_hash,
-                base64.b64decode(req.identity_key),
-                base64.b64decode(req.signed_prekey),
-                base64.b64decode(req.prekey_signature),
+                req.identity_key,
+                req.signed_prekey,
+                req.prekey_signature,
             )
-
-        for otpk in req.one_time_prekeys:
-            await conn.execute(
-                """
-                INSERT INTO one_time_prekeys (user_id, key_id, public_key)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (user_id, key_id) DO UPDATE SET public_key = $3, used = FALSE
-            """,
-                user_id,
-                otpk["key_id"],
-                base64.b64decode(otpk["public_key"]),
+            await conn.executemany(
+                SQL_UPSERT_ONE_TIME_PREKEY,
+                [
+                    (user_id, otpk.key_id, otpk.public_key)
+                    for otpk in req.one_time_prekeys
+                ],
             )
 
     return {"status": "registered", "user_id": str(user_id)}
@@ -100,42 +148,27 @@ async def register_user(request: Request, req: RegisterRequest):
 @router.get("/keys/{phone_hash}", response_model=KeyBundleResponse)
 @limiter.limit("5/minute")
 async def get_key_bundle(request: Request, phone_hash: str):
-    from app.main import db_pool
+    try:
+        phone_hash_bytes = _parse_phone_hash(phone_hash)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    async with db_pool.acquire() as conn:
-        user = await conn.fetchrow(
-            """
-            SELECT id, identity_key, signed_prekey, prekey_signature
-            FROM users WHERE phone_hash = $1
-        """,
-            phone_hash,
-        )
+    async with state.db_pool.acquire() as conn:
+        user = await conn.fetchrow(SQL_GET_KEY_BUNDLE_USER, phone_hash_bytes)
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        otpk = await conn.fetchrow(
-            """
-            UPDATE one_time_prekeys
-            SET used = TRUE
-            WHERE id = (
-                SELECT id FROM one_time_prekeys
-                WHERE user_id = $1 AND NOT used
-                ORDER BY created_at
-                LIMIT 1
-            )
-            RETURNING key_id, public_key
-        """,
-            user["id"],
-        )
+        otpk = await conn.fetchrow(SQL_CLAIM_ONE_TIME_PREKEY, user["id"])
 
+        # BYTEA columns are decoded to Base64 text by the connection codec
         return {
-            "identity_key": base64.b64encode(user["identity_key"]).decode(),
-            "signed_prekey": base64.b64encode(user["signed_prekey"]).decode(),
-            "prekey_signature": base64.b64encode(user["prekey_signature"]).decode(),
+            "identity_key": user["identity_key"],
+            "signed_prekey": user["signed_prekey"],
+            "prekey_signature": user["prekey_signature"],
             "one_time_prekey": {
                 "key_id": otpk["key_id"],
-                "public_key": base64.b64encode(otpk["public_key"]).decode(),
+                "public_key": otpk["public_key"],
             }
             if otpk
             else None,
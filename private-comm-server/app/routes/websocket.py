@@ -1,15 +1,59 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from app.main import manager, db_pool, active_connections
+from app.internal import state
+from app.internal.state import PendingMessage, manager
 from app.routes.auth import decode_websocket_token
-import json
-import base64
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
 import logging
+import time
+from functools import partial
+from typing import List
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# (epoch second, ISO string) of the last relay timestamp handed out
+_ts_cache = [0, ""]
+
+
+def _now_iso() -> str:
+    """Current UTC time at second resolution, formatted once per second"""
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[0] = now
+        _ts_cache[1] = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    return _ts_cache[1]
+
+
+def _stored_iso(ts: datetime) -> str:
+    """Format a pending_messages timestamp (naive UTC) like a relay timestamp"""
+    return ts.replace(microsecond=0, tzinfo=timezone.utc).isoformat()
+
+
+SQL_DRAIN_PENDING = """
+    WITH drained AS (
+        DELETE FROM pending_messages
+        WHERE recipient_id = $1
+        RETURNING sender_id, encrypted_payload, timestamp
+    )
+    SELECT * FROM drained ORDER BY timestamp
+"""
+
+SQL_STORE_PENDING = """
+    INSERT INTO pending_messages (recipient_id, sender_id, encrypted_payload)
+    VALUES ($1, $2, $3)
+"""
+
+SQL_RESTORE_PENDING = """
+    INSERT INTO pending_messages
+        (recipient_id, sender_id, encrypted_payload, timestamp)
+    VALUES ($1, $2, $3, $4)
+"""
+
+# Most messages sent in one backlog frame on reconnect
+PENDING_BATCH_SIZE = 100
+
 
 @router.websocket("/ws")
 async def websocket_endpoint(
@@ -21,39 +65,80 @@ async def websocket_endpoint(
         await websocket.close(code=1008, reason="Invalid or expired token")
         return
 
-    await manager.connect(user_id, websocket)
-
     try:
-        async with db_pool.acquire() as conn:
-            pending = await conn.fetch(
-                """
-                SELECT id, sender_id, encrypted_payload, timestamp
-                FROM pending_messages
-                WHERE recipient_id = $1
-                ORDER BY timestamp
-            """,
-                user_id,
-            )
-
-            for msg in pending:
-                await websocket.send_json(
-                    {
-                        "type": "encrypted_message",
-                        "sender_id": str(msg["sender_id"]),
-                        "payload": base64.b64encode(msg["encrypted_payload"]).decode(),
-                        "timestamp": msg["timestamp"].isoformat(),
-                    }
-                )
-                await conn.execute(
-                    "DELETE FROM pending_messages WHERE id = $1", msg["id"]
-                )
+        await manager.connect(
+            user_id, websocket, backlog=partial(_deliver_pending, user_id)
+        )
 
         while True:
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             await handle_message(user_id, data)
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        await manager.disconnect(user_id, websocket)
+
+
+async def _deliver_pending(user_id: str, websocket: WebSocket):
+    """Send messages queued while the user was offline, before any live ones"""
+    # Hold a pool connection only for the drain; the socket may stay open
+    # for hours and must not pin a database connection while it does
+    async with state.db_pool.acquire() as conn:
+        pending = await conn.fetch(SQL_DRAIN_PENDING, user_id)
+
+    sent = 0
+    try:
+        # Deliver the backlog in bounded batches instead of one frame per
+        # message, so a long absence does not produce one huge frame
+        while sent < len(pending):
+            batch = pending[sent : sent + PENDING_BATCH_SIZE]
+            await websocket.send_text(
+                orjson.dumps(
+                    {
+                        "type": "batch",
+                        "messages": [
+                            {
+                                "type": "encrypted_message",
+                                "sender_id": str(msg["sender_id"]),
+                                "payload": msg["encrypted_payload"],
+                                "timestamp": _stored_iso(msg["timestamp"]),
+                            }
+                            for msg in batch
+                        ],
+                    }
+                ).decode()
+            )
+            sent += len(batch)
+    except BaseException:
+        # The drain already deleted these rows; put back the ones not yet
+        # sent so a failed send does not lose them
+        async with state.db_pool.acquire() as conn:
+            await conn.executemany(
+                SQL_RESTORE_PENDING,
+                [
+                    (
+                        user_id,
+                        msg["sender_id"],
+                        msg["encrypted_payload"],
+                        msg["timestamp"],
+                    )
+                    for msg in pending[sent:]
+                ],
+            )
+        raise
+
+
+async def _store_undelivered(recipient_id: str, messages: List[PendingMessage]):
+    """Keep relayed messages a dropped connection never sent for its next login"""
+    async with state.db_pool.acquire() as conn:
+        await conn.executemany(
+            SQL_STORE_PENDING,
+            [(recipient_id, sender_id, payload) for sender_id, payload in messages],
+        )
+
+
+manager.set_undelivered_handler(_store_undelivered)
 
 
 async def handle_message(sender_id: str, data: dict):
@@ -65,30 +150,24 @@ async def handle_message(sender_id: str, data: dict):
 
     if msg_type == "encrypted_message":
         payload = data.get("payload")
-        if not payload:
+        if not payload or not isinstance(payload, str):
             return
 
-        delivered = await manager.send_to_user(
-            recipient_id,
+        frame = orjson.dumps(
             {
                 "type": "encrypted_message",
                 "sender_id": sender_id,
                 "payload": payload,
-                "timestamp": datetime.utcnow().isoformat(),
-            },
+                "timestamp": _now_iso(),
+            }
+        ).decode()
+        delivered = await manager.send_frame(
+            recipient_id, frame, (sender_id, payload)
         )
 
         if not delivered:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO pending_messages (recipient_id, sender_id, encrypted_payload)
-                    VALUES ($1, $2, $3)
-                """,
-                    recipient_id,
-                    sender_id,
-                    base64.b64decode(payload),
-                )
+            async with state.db_pool.acquire() as conn:
+                await conn.execute(SQL_STORE_PENDING, recipient_id, sender_id, payload)
 
     elif msg_type in [
         "call_offer",
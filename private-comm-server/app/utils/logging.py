@@ -1,5 +1,5 @@
 import logging
-import json
+import orjson
 import uuid
 from typing import Optional
 from contextvars import ContextVar
@@ -14,7 +14,7 @@ class JSONFormatter(logging.Formatter):
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
-            "request_id": request_id.get(),
+            "request_id": getattr(record, "request_id", ""),
         }
 
         if record.exc_info:
@@ -23,43 +23,41 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, "extra_data") and record.extra_data:
             log_data.update(record.extra_data)
 
-        return json.dumps(log_data)
+        return orjson.dumps(log_data, default=str).decode()
 
 
-class CorrelationLogger:
+class _RequestIdFilter(logging.Filter):
+    """Stamp records with the request id of the context that logged them"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+_SHARED_FORMATTER = JSONFormatter()
+_REQUEST_ID_FILTER = _RequestIdFilter()
+
+# Keyword arguments consumed by Logger._log; any others become extra_data
+_LOG_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+class CorrelationLogger(logging.LoggerAdapter):
     def __init__(self, name: str):
-        self.logger = logging.getLogger(name)
-        handler = logging.StreamHandler()
-        handler.setFormatter(JSONFormatter())
-        self.logger.addHandler(handler)
+        super().__init__(logging.getLogger(name), {})
+        # Loggers are process-wide; only attach the handler the first time
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(_SHARED_FORMATTER)
+            handler.addFilter(_REQUEST_ID_FILTER)
+            self.logger.addHandler(handler)
+            self.logger.propagate = False
         self.logger.setLevel(logging.INFO)
 
-    def info(self, msg: str, **kwargs):
-        extra = kwargs.pop("extra", {})
-        extra_data = kwargs
-        record = self.logger.makeRecord(
-            self.logger.name, logging.INFO, msg, (), extra=extra
-        )
-        record.extra_data = extra_data
-        self.logger.handle(record)
-
-    def error(self, msg: str, exc_info=None, **kwargs):
-        extra = kwargs.pop("extra", {})
-        extra_data = kwargs
-        record = self.logger.makeRecord(
-            self.logger.name, logging.ERROR, msg, (), exc_info=exc_info, extra=extra
-        )
-        record.extra_data = extra_data
-        self.logger.handle(record)
-
-    def warning(self, msg: str, **kwargs):
-        extra = kwargs.pop("extra", {})
-        extra_data = kwargs
-        record = self.logger.makeRecord(
-            self.logger.name, logging.WARNING, msg, (), extra=extra
-        )
-        record.extra_data = extra_data
-        self.logger.handle(record)
+    def process(self, msg, kwargs):
+        # Only reached when the level is enabled, so disabled calls cost nothing
+        log_kwargs = {key: kwargs.pop(key) for key in _LOG_KWARGS if key in kwargs}
+        log_kwargs["extra"] = {**(log_kwargs.get("extra") or {}), "extra_data": kwargs}
+        return msg, log_kwargs
 
 
 def setup_logging():